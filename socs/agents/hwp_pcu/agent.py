@@ -1,7 +1,7 @@
 import argparse
 import time
 from dataclasses import dataclass
-from queue import Queue
+from queue import Empty, Queue
 
 import txaio
 from twisted.internet import defer, reactor, threads
@@ -69,16 +69,14 @@ class HWPPCUAgent:
         session.data = yield action.deferred
         return True, f"Set relays for cmd={action.command}"
 
-    def _process_actions(self, PCU: pcu.PCU):
-        while not self.action_queue.empty():
-            action = self.action_queue.get()
-            try:
-                self.log.info(f"Running action {action}")
-                res = process_action(action, PCU)
-                reactor.callFromThread(action.deferred.callback, res)
-            except Exception as e:
-                self.log.error(f"Error processing action: {action}")
-                reactor.callFromThread(action.deferred.errback, e)
+    def _process_action(self, action, PCU: pcu.PCU):
+        try:
+            self.log.info(f"Running action {action}")
+            res = process_action(action, PCU)
+            reactor.callFromThread(action.deferred.callback, res)
+        except Exception as e:
+            self.log.error(f"Error processing action: {action}")
+            reactor.callFromThread(action.deferred.errback, e)
 
     def _get_and_publish_data(self, PCU: pcu.PCU, session):
         now = time.time()
@@ -98,6 +96,8 @@ class HWPPCUAgent:
     def _clear_queue(self):
         while not self.action_queue.empty():
             action = self.action_queue.get()
+            if action is None:
+                continue
             action.deferred.errback(Exception("Action cancelled"))
 
     def main(self, session, params):
@@ -124,12 +124,20 @@ class HWPPCUAgent:
                     time.sleep(30)
                     continue
             now = time.time()
-            if now - last_daq > 5:
+            if now - last_daq >= 5:
                 self._get_and_publish_data(PCU, session)
                 last_daq = now
 
-            self._process_actions(PCU)
-            time.sleep(0.1)
+            # Wait for an action until the next data acquisition is due
+            try:
+                action = self.action_queue.get(
+                    timeout=max(0, last_daq + 5 - time.time()))
+            except Empty:
+                continue
+
+            # None is put on the queue by _stop_main to wake up the loop
+            if action is not None:
+                self._process_action(action, PCU)
 
         PCU.close()
 
@@ -138,6 +146,7 @@ class HWPPCUAgent:
         Stop acq process.
         """
         session.set_status('stopping')
+        self.action_queue.put(None)
         return True, 'Set main status to stopping'
 
 
@@ -2,6 +2,9 @@ import time
 
 import serial
 
+# Relay channels used by the PCU, in the order of the patterns below
+channels = [0, 1, 2, 5, 6, 7]
+
 patterns = {
     'off': [0, 0, 0, 0, 0, 0],
     'on_1': [1, 1, 1, 0, 0, 0],
@@ -9,6 +12,15 @@ patterns = {
     'stop': [0, 1, 1, 1, 0, 0],
 }
 
+# (on_mask, off_mask) relay bit masks for each command, built from patterns
+masks = {
+    command: (
+        sum(1 << i for i, p in zip(channels, pattern) if p),
+        sum(1 << i for i, p in zip(channels, pattern) if not p),
+    )
+    for command, pattern in patterns.items()
+}
+
 
 class PCU:
     """Class to communicate with the phase compensation unit.
@@ -67,16 +79,32 @@ class PCU:
         else:
             return -1
 
-    def send_command(self, command):
-        pattern = patterns[command]
-        for i, p in zip([0, 1, 2, 5, 6, 7], pattern):
-            if p:
-                self.relay_on(i)
+    def set_relay_mask(self, on_mask, off_mask):
+        """Switch on the relays set in ``on_mask`` and switch off the relays
+        set in ``off_mask``.
+
+        Relays are switched one at a time, waiting for each command's echo
+        before sending the next, since it is not confirmed that the device
+        accepts back-to-back commands without dropping any.
+
+        Args:
+            on_mask (int): Bit mask of relay channels to switch on
+            off_mask (int): Bit mask of relay channels to switch off
+        """
+        for channel in range(8):
+            if on_mask >> channel & 1:
+                self.relay_on(channel)
+            elif off_mask >> channel & 1:
+                self.relay_off(channel)
             else:
-                self.relay_off(i)
+                continue
             self.sleep()
             self.read()
 
+    def send_command(self, command):
+        on_mask, off_mask = masks[command]
+        self.set_relay_mask(on_mask, off_mask)
+
     def get_status(self):
         """get_status()
 
@@ -86,10 +114,9 @@ class PCU:
         on_2: The compensation phase is -120 deg.
         stop: Stop the HWP spin.
         """
-        channel = [0, 1, 2, 5, 6, 7]
         channel_switch = []
 
-        for i in channel:
+        for i in channels:
             channel_switch.append(self.relay_read(i))
         if -1 in channel_switch:
             return 'failed'
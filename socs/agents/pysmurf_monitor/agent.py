@@ -2,17 +2,27 @@ import argparse
 import json
 import os
 import queue
+import socket
 import time
 import traceback
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
+import orjson
 import sqlalchemy
 import txaio  # type: ignore
 from ocs import ocs_agent, ocs_feed, site_config
 from twisted.internet import reactor
 from twisted.internet.protocol import DatagramProtocol
 
-from socs.db.suprsync import SupRsyncFilesManager, create_file
+from socs.db.suprsync import SupRsyncFile, SupRsyncFilesManager, create_file
+
+# Pysmurf files containing any of these strings in their path are
+# "semi-permanent" and will not be deleted after copying. We may want to add
+# more to this list later.
+SEMI_PERMANENT_KEYS = ("iv", "channel_assignment", "tune")
+
+# Minimum time (sec) the run process blocks waiting for registered files
+MIN_QUEUE_TIMEOUT = 0.1
 
 
 def create_remote_path(meta: Dict[str, Any], archive_name: str) -> str:
@@ -91,6 +101,22 @@ class PysmurfMonitor(DatagramProtocol):
         echo_sql (bool):
             If True, will echo all sql statements whenever writing to the
             suprsync db.
+        create_table (bool):
+            If True, the run process creates the suprsync db tables if they
+            do not exist.
+        db_pool_size (int):
+            Number of connections to the suprsync db to keep open inside the
+            connection pool.
+        db_pool_max_overflow (int):
+            Number of connections to allow in the overflow pool.
+        flush_interval (float):
+            Max time (sec) registered files are held before being added to
+            the suprsync db.
+        batch_size (int):
+            Max number of files added to the suprsync db in one transaction.
+        udp_recv_buffer (int):
+            Requested size (bytes) of the kernel receive buffer for the UDP
+            socket.
     """
 
     def __init__(self, agent: ocs_agent.OCSAgent, args: argparse.Namespace) -> None:
@@ -100,9 +126,45 @@ class PysmurfMonitor(DatagramProtocol):
         self.db_path: str = args.db_path
         self.running: bool = False
         self.echo_sql: bool = args.echo_sql
+        self.create_table: bool = args.create_table
+        self.db_pool_size: int = args.db_pool_size
+        self.db_pool_max_overflow: int = args.db_pool_max_overflow
+        self.flush_interval: float = args.flush_interval
+        self.batch_size: int = args.batch_size
+        self.udp_recv_buffer: int = args.udp_recv_buffer
+
+        # Handlers for each type of message sent by the publisher
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            'data_file': self._handle_file,
+            'g3_file': self._handle_file,
+            'session_data': self._handle_session,
+            'session_log': self._handle_session,
+            'metadata': self._handle_metadata,
+        }
 
         self.agent.register_feed('pysmurf_session_data')
 
+    def startProtocol(self) -> None:
+        """
+        Called when the UDP port starts listening. Enlarges the socket receive
+        buffer so bursts of publisher messages are not dropped by the kernel
+        while the reactor is busy.
+        """
+        if not self.udp_recv_buffer:
+            return
+
+        sock = self.transport.getHandle()
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            self.udp_recv_buffer)
+        except OSError as e:
+            self.log.warn("Could not set UDP receive buffer size: {e}", e=e)
+            return
+
+        # The kernel may clamp the requested size (e.g. to net.core.rmem_max)
+        size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self.log.info("UDP receive buffer size: {size} bytes", size=size)
+
     def datagramReceived(self, _data: bytes, addr: Tuple[str, int]) -> None:
         """
         Called whenever UDP data is received.
@@ -114,48 +176,92 @@ class PysmurfMonitor(DatagramProtocol):
             addr (tuple):
                 (host, port) of the sender.
         """
-        data = json.loads(_data)
-        pub_id = data['id']
-
-        if data['type'] in ['data_file', 'g3_file']:
-            self.log.info("New file: {fname}", fname=data['payload']['path'])
-            data['payload']['pub_id'] = pub_id
-            self.file_queue.put(data['payload'])
+        try:
+            data = orjson.loads(_data)
+        except orjson.JSONDecodeError:
+            # orjson is strict RFC 8259 and rejects NaN / Infinity, which the
+            # publisher's json.dumps will happily emit
+            data = json.loads(_data)
+        handler = self._handlers.get(data['type'])
+        if handler is not None:
+            handler(data)
+
+    def _handle_file(self, data: Dict[str, Any]) -> None:
+        """Queues a newly registered file to be added to the suprsync db."""
+        self.log.info("New file: {fname}", fname=data['payload']['path'])
+        data['payload']['pub_id'] = data['id']
+        self.file_queue.put(data['payload'])
+
+    def _handle_session(self, data: Dict[str, Any]) -> None:
+        """Passes session data and logs on to the pysmurf-controller."""
+        self.agent.publish_to_feed(
+            "pysmurf_session_data", data, from_reactor=True
+        )
 
-        elif data['type'] == "session_data" or data['type'] == "session_log":
-            self.agent.publish_to_feed(
-                "pysmurf_session_data", data, from_reactor=True
-            )
+    def _handle_metadata(self, data: Dict[str, Any]) -> None:
+        """Handles published metadata from the streamer."""
+        self.log.debug("Received Metadata: {payload}", payload=data['payload'])
+        pub_id = data['id']
 
-        # Handles published metadata from the streamer
-        elif data['type'] == "metadata":
-            self.log.debug("Received Metadata: {payload}", payload=data['payload'])
+        # streamer publisher-id looks like `STREAMER:<stream-id>`
+        if ':' in pub_id:
+            stream_id = pub_id.split(':')[1]
+        else:
+            # This is so that this still works before people update to the
+            # version of the stream fuction where the pub-id is set
+            # properly. In this case the stream-id will be something like
+            # "unidentified"
+            stream_id = pub_id
 
-            # streamer publisher-id looks like `STREAMER:<stream-id>`
-            if ':' in pub_id:
-                stream_id = pub_id.split(':')[1]
-            else:
-                # This is so that this still works before people update to the
-                # version of the stream fuction where the pub-id is set
-                # properly. In this case the stream-id will be something like
-                # "unidentified"
-                stream_id = pub_id
+        path = data['payload']['path']
+        val = data['payload']['value']
+        data['payload']['type']
 
-            path = data['payload']['path']
-            val = data['payload']['value']
-            data['payload']['type']
+        field_name = ocs_feed.Feed.enforce_field_name_rules(path)
+        feed_name = f'{stream_id}_meta'
 
-            field_name = ocs_feed.Feed.enforce_field_name_rules(path)
-            feed_name = f'{stream_id}_meta'
+        if feed_name not in self.agent.feeds:
+            self.agent.register_feed(feed_name, record=True, buffer_time=0)
 
-            if feed_name not in self.agent.feeds:
-                self.agent.register_feed(feed_name, record=True, buffer_time=0)
+        feed_data = {'block_name': field_name,
+                     'timestamp': data['time'],
+                     'data': {field_name: val}}
 
-            feed_data = {'block_name': field_name,
-                         'timestamp': data['time'],
-                         'data': {field_name: val}}
+        self.agent.publish_to_feed(feed_name, feed_data, from_reactor=True)
 
-            self.agent.publish_to_feed(feed_name, feed_data, from_reactor=True)
+    def _create_file(self, meta: Dict[str, Any]) -> Optional[SupRsyncFile]:
+        """
+        Creates a SupRsyncFile object from the metadata of a registered file.
+        Returns None if the object could not be created.
+        """
+        # Archive name defaults to pysmurf because that is currently
+        # the only archive. The smurf-streamer will set the
+        # archive_name to "timestreams"
+        archive_name = meta.get('archive_name', 'smurf')
+        try:
+            if (meta.get('format') == 'npy') and (not meta['path'].endswith('.npy')):
+                meta['path'] += '.npy'
+            local_path = meta['path']
+            remote_path = create_remote_path(meta, archive_name)
+
+            # Only delete files that are in timestamped directories
+            # /data/smurf_data/<timestamp> and are not semi-permanent files
+            deletable = True
+            if archive_name == 'smurf':
+                deletable = (
+                    local_path.split('/')[3].isdigit()
+                    and not any(key in local_path for key in SEMI_PERMANENT_KEYS)
+                )
+
+            return create_file(local_path, remote_path, archive_name,
+                               deletable=deletable)
+        except Exception as e:
+            self.agent.log.error(
+                "Could not generate SupRsync file object from "
+                "metadata:\n{meta}\nRaised Exception: {e}",
+                meta=meta, e=e
+            )
+            return None
 
     @ocs_agent.param('test_mode', default=False, type=bool)
     def run(
@@ -174,45 +280,32 @@ class PysmurfMonitor(DatagramProtocol):
                 Stop the Process loop after processing any file(s).
                 This is meant only for testing. Default is False.
         """
-        srfm = SupRsyncFilesManager(self.db_path, create_all=True, echo=self.echo_sql)
+        srfm = SupRsyncFilesManager(
+            self.db_path, create_all=self.create_table, echo=self.echo_sql,
+            pool_size=self.db_pool_size, max_overflow=self.db_pool_max_overflow
+        )
 
         self.running = True
         files_to_add = []
         while self.running:
-            while not self.file_queue.empty():
-                meta = self.file_queue.get()
-                # Archive name defaults to pysmurf because that is currently
-                # the only archive. The smurf-streamer will set the
-                # archive_name to "timestreams"
-                archive_name = meta.get('archive_name', 'smurf')
+            # Collect files until the batch is full or the flush interval
+            # has passed, then add them all in a single transaction
+            flush_time = time.time() + self.flush_interval
+            while len(files_to_add) < self.batch_size:
+                # Always block for a minimum time so an empty queue cannot
+                # make the loop spin, even with a flush interval <= 0
+                timeout = max(flush_time - time.time(), MIN_QUEUE_TIMEOUT)
                 try:
-                    if (meta.get('format') == 'npy') and (not meta['path'].endswith('.npy')):
-                        meta['path'] += '.npy'
-                    local_path = meta['path']
-                    remote_path = create_remote_path(meta, archive_name)
-
-                    # Only delete files that are in timestamped directories
-                    # /data/smurf_data/<timestamp> and are not IV, channel
-                    # assignment, or tune files. We may want to add more to
-                    # this list of "semi-permanent files" later
-                    deletable = True
-                    if archive_name == 'smurf':
-                        if not local_path.split('/')[3].isdigit():
-                            deletable = False
-                        for key in ["iv", "channel_assignment", "tune"]:
-                            if key in local_path:
-                                deletable = False
-
-                    files_to_add.append(
-                        create_file(local_path, remote_path, archive_name,
-                                    deletable=deletable)
-                    )
-                except Exception as e:
-                    self.agent.log.error(
-                        "Could not generate SupRsync file object from "
-                        "metadata:\n{meta}\nRaised Exception: {e}",
-                        meta=meta, e=e
-                    )
+                    meta = self.file_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                file = self._create_file(meta)
+                if file is not None:
+                    files_to_add.append(file)
+
+                if time.time() >= flush_time:
+                    break
 
             if files_to_add:
                 try:
@@ -231,8 +324,6 @@ class PysmurfMonitor(DatagramProtocol):
             if params['test_mode']:
                 break
 
-            time.sleep(1)
-
         return True, 'Monitor exited cleanly.'
 
     def _stop(
@@ -245,6 +336,15 @@ class PysmurfMonitor(DatagramProtocol):
         return True, 'Done monitoring.'
 
 
+def _str_to_bool(value: str) -> bool:
+    """Converts a command line string such as 'True' or 'false' to a bool."""
+    if value.lower() in ('true', 'yes', '1'):
+        return True
+    if value.lower() in ('false', 'no', '0'):
+        return False
+    raise argparse.ArgumentTypeError(f"Invalid boolean value: '{value}'")
+
+
 def make_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.ArgumentParser:
     if parser is None:
         parser = argparse.ArgumentParser()
@@ -252,12 +352,31 @@ def make_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.Ar
     pgroup = parser.add_argument_group('Agent Options')
     pgroup.add_argument('--udp-port', type=int,
                         help="Port for upd-publisher")
-    pgroup.add_argument('--create-table', type=bool,
-                        help="Specifies whether agent should create or update "
-                             "pysmurf_files table if non exists.", default=True)
+    pgroup.add_argument('--udp-recv-buffer', type=int, default=8 * 1024**2,
+                        help="Requested size (bytes) of the UDP socket receive "
+                             "buffer. Set to 0 to use the system default.")
+    pgroup.add_argument('--create-table', type=_str_to_bool,
+                        help="Specifies whether agent should create the "
+                             "suprsync db tables if they do not exist.",
+                        default=True)
     pgroup.add_argument('--db-path', type=str, default='/data/so/databases/suprsync.db',
                         help="Path to suprsync sqlite database")
     pgroup.add_argument('--echo-sql', action='store_true')
+    pgroup.add_argument(
+        '--db-pool-size', type=int, default=5,
+        help="Number of connections to the suprsync db to keep open inside the "
+             "connection pool"
+    )
+    pgroup.add_argument(
+        '--db-pool-max-overflow', type=int, default=10,
+        help="Number of connections to allow in the overflow pool."
+    )
+    pgroup.add_argument('--flush-interval', type=float, default=0.5,
+                        help="Max time (sec) registered files are held before "
+                             "being added to the suprsync db")
+    pgroup.add_argument('--batch-size', type=int, default=128,
+                        help="Max number of files to add to the suprsync db "
+                             "in a single transaction")
     pgroup.add_argument("--test-mode", action='store_true',
                         help="Specifies whether agent should run in test mode, "
                         "meaning it shuts down after processing any file(s).")
@@ -8,6 +8,9 @@ from ocs import ocs_agent, site_config
 
 from socs.db.suprsync import SupRsyncFileHandler, SupRsyncFilesManager
 
+# Number of consecutive idle iterations between "no files copied" log messages
+IDLE_LOG_ITERATIONS = 60
+
 
 class SupRsync:
     """
@@ -34,6 +37,9 @@ class SupRsync:
         Remote host to copy data to. If None, will copy data locally.
     ssh_key : str, optional
         ssh-key to use to access the ssh host.
+    ssh_control_persist : int, optional
+        If set, ssh connections to the ssh host are shared and the master
+        connection is kept open for this many seconds after its last use.
     remote_basedir : path
         Base directory on the destination server to copy files to
     db_path : path
@@ -44,6 +50,8 @@ class SupRsync:
         Time (sec) for which cmds run on the remote will timeout
     copy_timeout : float
         Time (sec) after which a copy command will timeout
+    copy_workers : int
+        Number of rsync processes to run concurrently for each batch of files
     """
 
     def __init__(self, agent: ocs_agent.OCSAgent, args: argparse.Namespace) -> None:
@@ -53,6 +61,7 @@ class SupRsync:
         self.archive_name = args.archive_name
         self.ssh_host = args.ssh_host
         self.ssh_key = args.ssh_key
+        self.ssh_control_persist = args.ssh_control_persist
         self.remote_basedir = args.remote_basedir
         self.db_path = args.db_path
         self.delete_after = args.delete_local_after
@@ -60,6 +69,7 @@ class SupRsync:
         self.running = False
         self.cmd_timeout = args.cmd_timeout
         self.copy_timeout = args.copy_timeout
+        self.copy_workers = args.copy_workers
         self.files_per_batch = args.files_per_batch
         self.sleep_time = args.sleep_time
         self.compression = args.compression
@@ -124,7 +134,8 @@ class SupRsync:
             srfm, self.archive_name, self.remote_basedir, ssh_host=self.ssh_host,
             ssh_key=self.ssh_key, cmd_timeout=self.cmd_timeout,
             copy_timeout=self.copy_timeout, compression=self.compression,
-            bwlimit=self.bwlimit
+            bwlimit=self.bwlimit, copy_workers=self.copy_workers,
+            ssh_control_persist=self.ssh_control_persist
         )
 
         self.running = True
@@ -145,6 +156,9 @@ class SupRsync:
 
         next_feed_update = 0
 
+        # Number of consecutive iterations in which no files were copied
+        idle_iterations = 0
+
         # update tcdirs every six-hours
         last_tcdir_update = 0
         tcdir_update_interval = 6 * 3600
@@ -208,6 +222,23 @@ class SupRsync:
                 self.archive_name, self.suprsync_file_root, self.instance_id)
 
             session.data['activity'] = 'idle'
+
+            # Only count successful copies, so failing files are retried
+            # at the normal sleep interval
+            ncopied = sum(ok for _, ok in op.get('files', []))
+            if ncopied:
+                idle_iterations = 0
+            else:
+                idle_iterations += 1
+                if idle_iterations % IDLE_LOG_ITERATIONS == 0:
+                    self.log.info("No files copied in the last {n} iterations",
+                                  n=idle_iterations)
+
+            # A full batch means there are likely more files waiting, so
+            # start the next iteration right away
+            if self.files_per_batch is not None and ncopied >= self.files_per_batch:
+                continue
+
             time.sleep(self.sleep_time)
 
         return True, "Stopped run process"
@@ -235,6 +266,12 @@ def make_parser(parser=None):
                              "'<user>@<host>'). If None, will copy files locally")
     pgroup.add_argument('--ssh-key', type=str,
                         help="Path to ssh-key needed to access remote host")
+    pgroup.add_argument('--ssh-control-persist', type=int, default=None,
+                        help="If set, share a single ssh connection to the "
+                             "remote host between rsync and remote commands, "
+                             "keeping it open for this many seconds after its "
+                             "last use. If None, every command opens its own "
+                             "connection.")
     pgroup.add_argument('--delete-local-after', type=float,
                         help="Time (sec) after which this agent will delete "
                              "local copies of successfully transfered files. "
@@ -244,13 +281,18 @@ def make_parser(parser=None):
                              "will stop trying to copy a file")
     pgroup.add_argument('--copy-timeout', type=float,
                         help="Time (sec) before the rsync command will timeout")
+    pgroup.add_argument('--copy-workers', type=int, default=1,
+                        help="Number of rsync processes to run concurrently "
+                             "when copying a batch of files")
     pgroup.add_argument('--cmd-timeout', type=float,
                         help="Time (sec) before remote commands will timeout")
     pgroup.add_argument('--files-per-batch', type=int,
                         help="Number of files to copy over per batch. Default "
                         "is None, which will copy over all available files.")
     pgroup.add_argument('--sleep-time', type=float, default=60,
-                        help="Time to sleep (sec) in between copy iterations")
+                        help="Time to sleep (sec) in between copy iterations. "
+                             "Skipped if the previous iteration copied a full "
+                             "batch of files.")
     pgroup.add_argument('--compression', action='store_true', default=False,
                         help="Activate gzip on data transfer (rsync -z)")
     pgroup.add_argument('--bwlimit', type=str, default=None,
@@ -6,7 +6,7 @@ import time
 import txaio
 import yaml
 from sqlalchemy import (Boolean, Column, Float, ForeignKey, Integer, String,
-                        asc, create_engine)
+                        asc, create_engine, event, or_)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -186,6 +186,19 @@ def create_file(local_path, remote_path, archive_name, local_md5sum=None,
     return file
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configures new sqlite connections. Write-ahead logging lets readers
+    (e.g. the SupRsync agents) work while a writer (e.g. the pysmurf-monitor)
+    is committing, and with ``synchronous=NORMAL`` commits no longer fsync
+    the database, only checkpoints do.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 class SupRsyncFilesManager:
     """
     Helper class for accessing and adding entries to the SupRsync
@@ -213,6 +226,7 @@ class SupRsyncFilesManager:
             f'sqlite:///{db_path}', echo=echo,
             pool_size=pool_size, max_overflow=max_overflow,
         )
+        event.listen(self._engine, 'connect', _set_sqlite_pragmas)
         self.Session = sessionmaker(bind=self._engine)
 
         if create_all:
@@ -355,17 +369,14 @@ class SupRsyncFilesManager:
             SupRsyncFile.archive_name == archive_name,
             SupRsyncFile.failed_copy_attempts < max_copy_attempts,
             SupRsyncFile.ignore == False,  # noqa: E712
+            or_(SupRsyncFile.remote_md5sum == None,  # noqa: E711
+                SupRsyncFile.local_md5sum != SupRsyncFile.remote_md5sum),
         )
 
-        files = []
-        for f in query.all():
-            if f.local_md5sum != f.remote_md5sum:
-                files.append(f)
-            if num_files is not None:
-                if len(files) >= num_files:
-                    break
+        if num_files is not None:
+            query = query.limit(num_files)
 
-        return files
+        return query.all()
 
     def get_deletable_files(self, archive_name, delete_after, session=None):
         """
@@ -390,16 +401,11 @@ class SupRsyncFilesManager:
             SupRsyncFile.removed == None,  # noqa: E711
             SupRsyncFile.archive_name == archive_name,
             SupRsyncFile.deletable,
+            SupRsyncFile.local_md5sum == SupRsyncFile.remote_md5sum,
+            SupRsyncFile.timestamp < time.time() - delete_after,
         )
 
-        files = []
-        now = time.time()
-        for f in query.all():
-            if f.local_md5sum == f.remote_md5sum:
-                if now > f.timestamp + delete_after:
-                    files.append(f)
-
-        return files
+        return query.all()
 
     def get_known_files(self, archive_name, session=None, min_ctime=None):
         """Gets all files.  This can be used to help avoid
@@ -551,11 +557,17 @@ class SupRsyncFileHandler:
     """
     Helper class to handle files in the suprsync db and copy them to their
     dest / delete them if enough time has passed.
+
+    Each batch of files is split between ``copy_workers`` rsync processes
+    that run concurrently. If ``ssh_control_persist`` is set, all ssh
+    connections to ``ssh_host`` are multiplexed over one master connection
+    that stays open for that many seconds after its last use.
     """
 
     def __init__(self, file_manager, archive_name, remote_basedir,
                  ssh_host=None, ssh_key=None, cmd_timeout=None,
-                 copy_timeout=None, compression=None, bwlimit=None):
+                 copy_timeout=None, compression=None, bwlimit=None,
+                 copy_workers=1, ssh_control_persist=None):
         self.srfm = file_manager
         self.archive_name = archive_name
         self.ssh_host = ssh_host
@@ -566,6 +578,57 @@ class SupRsyncFileHandler:
         self.copy_timeout = copy_timeout
         self.compression = compression
         self.bwlimit = bwlimit
+        self.copy_workers = copy_workers
+        self.ssh_control_persist = ssh_control_persist
+
+    def _ssh_cmd(self):
+        """Returns the ssh command (without host) used to reach ssh_host."""
+        cmd = ['ssh']
+        if self.ssh_key is not None:
+            cmd.extend(['-i', self.ssh_key])
+        if self.ssh_control_persist is not None:
+            control_path = os.path.join(tempfile.gettempdir(), 'suprsync-ssh-%C')
+            cmd.extend([
+                '-o', 'ControlMaster=auto',
+                '-o', f'ControlPath={control_path}',
+                '-o', f'ControlPersist={self.ssh_control_persist}',
+            ])
+        return cmd
+
+    def _run_parallel(self, cmds, timeout=None):
+        """
+        Runs a list of commands concurrently and waits for all of them to
+        finish. Like ``subprocess.run(..., check=True)``, raises
+        CalledProcessError if a command fails and TimeoutExpired if they do
+        not all finish within ``timeout`` seconds. Commands still running
+        when an error is raised are killed.
+
+        Parameters
+        -----------
+        cmds : list
+            List of commands to be run
+        timeout : float, optional
+            Time (sec) for all commands to complete
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        procs = []
+        try:
+            for cmd in cmds:
+                self.log.debug(f"Running: {' '.join(cmd)}")
+                procs.append(subprocess.Popen(cmd))
+
+            for proc in procs:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0, deadline - time.time())
+                retcode = proc.wait(timeout=remaining)
+                if retcode:
+                    raise subprocess.CalledProcessError(retcode, proc.args)
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
 
     def run_on_remote(self, cmd, timeout=None):
         """
@@ -578,9 +641,7 @@ class SupRsyncFileHandler:
         """
         _cmd = []
         if self.ssh_host is not None:
-            _cmd += ['ssh', self.ssh_host]
-            if self.ssh_key is not None:
-                _cmd.extend(['-i', self.ssh_key])
+            _cmd += self._ssh_cmd() + [self.ssh_host]
         _cmd += cmd
 
         if timeout is None:
@@ -625,15 +686,21 @@ class SupRsyncFileHandler:
             else:
                 dest = self.remote_basedir
 
-            # Creates temp directory with remote dir structure of symlinks for
-            # rsync to copy.
+            # Creates temp directories with remote dir structure of symlinks
+            # for rsync to copy. Files are split between ``copy_workers``
+            # directories, each of which is copied by its own rsync process.
+            nworkers = max(1, min(self.copy_workers, len(files)))
             file_map = {}
             remote_paths = []
-            with tempfile.TemporaryDirectory() as tmp_dir:
+            with tempfile.TemporaryDirectory() as tmp_root:
+                tmp_dirs = [os.path.join(tmp_root, str(i)) for i in range(nworkers)]
+                for tmp_dir in tmp_dirs:
+                    os.makedirs(tmp_dir)
+
                 self.log.info("Copying files:")
-                for file in files:
+                for i, file in enumerate(files):
                     self.log.info(f"- {file.local_path}")
-                    tmp_path = os.path.join(tmp_dir, file.remote_path)
+                    tmp_path = os.path.join(tmp_dirs[i % nworkers], file.remote_path)
                     os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
 
                     if not os.path.exists(file.local_path):
@@ -641,16 +708,17 @@ class SupRsyncFileHandler:
                         file.failed_copy_attempts += 1
                         continue
 
-                    if os.path.exists(tmp_path):
+                    remote_path = os.path.normpath(
+                        os.path.join(self.remote_basedir, file.remote_path)
+                    )
+
+                    if os.path.exists(tmp_path) or remote_path in file_map:
                         self.log.warn("Temp file {path} already exists!", path=tmp_path)
                         file.failed_copy_attempts += 1
                         continue
 
                     os.symlink(file.local_path, tmp_path)
 
-                    remote_path = os.path.normpath(
-                        os.path.join(self.remote_basedir, file.remote_path)
-                    )
                     remote_paths.append(remote_path)
                     file_map[remote_path] = file
 
@@ -659,11 +727,13 @@ class SupRsyncFileHandler:
                     cmd.append('-z')
                 if self.bwlimit:
                     cmd.append(f'--bwlimit={self.bwlimit}')
-                if self.ssh_key is not None:
-                    cmd.extend(['--rsh', f'ssh -i {self.ssh_key}'])
-                cmd.extend([tmp_dir + '/', dest])
+                if self.ssh_host is not None:
+                    cmd.extend(['--rsh', ' '.join(self._ssh_cmd())])
 
-                subprocess.run(cmd, check=True, timeout=self.copy_timeout)
+                self._run_parallel(
+                    [cmd + [tmp_dir + '/', dest] for tmp_dir in tmp_dirs],
+                    timeout=self.copy_timeout
+                )
 
             for file in files:
                 file.copied = time.time()
@@ -1,9 +1,20 @@
 import hashlib
 
+# Size of the blocks read from disk when computing file checksums
+_CHUNK_SIZE = 1 << 20
+
 
 def get_md5sum(filename):
     m = hashlib.md5()
 
-    for line in open(filename, 'rb'):
-        m.update(line)
+    # Read into a single reusable buffer to avoid allocating a new bytes
+    # object for every chunk
+    buf = bytearray(_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(filename, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            m.update(view[:n])
     return m.hexdigest()
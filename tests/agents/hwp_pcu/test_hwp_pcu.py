@@ -0,0 +1,43 @@
+from unittest import mock
+
+import pytest
+
+import socs.agents.hwp_pcu.drivers.hwp_pcu as pcu
+
+
+@pytest.fixture
+def PCU(monkeypatch):
+    monkeypatch.setattr(pcu.serial, 'Serial', mock.MagicMock())
+    monkeypatch.setattr(pcu.PCU, 'sleep', lambda self: None)
+    device = pcu.PCU('/dev/ttyACM0')
+    device.port.read_until.return_value = b'echo\n\r'
+    return device
+
+
+def written(device):
+    return [c.args[0] for c in device.port.write.call_args_list]
+
+
+def test_masks():
+    assert pcu.masks == {
+        'off': (0b00000000, 0b11100111),
+        'on_1': (0b00000111, 0b11100000),
+        'on_2': (0b11100111, 0b00000000),
+        'stop': (0b00100110, 0b11000001),
+    }
+
+
+def test_set_relay_mask(PCU):
+    PCU.set_relay_mask(0b00000101, 0b10000000)
+    assert written(PCU) == [b'relay on 0\n\r', b'relay on 2\n\r',
+                            b'relay off 7\n\r']
+    # One echo is read back per command
+    assert PCU.port.read_until.call_count == 3
+
+
+def test_send_command(PCU):
+    PCU.send_command('stop')
+    assert written(PCU) == [b'relay off 0\n\r', b'relay on 1\n\r',
+                            b'relay on 2\n\r', b'relay on 5\n\r',
+                            b'relay off 6\n\r', b'relay off 7\n\r']
+    assert PCU.port.read_until.call_count == 6
@@ -1 +1,74 @@
-from socs.agents.pysmurf_monitor.agent import PysmurfMonitor  # noqa: F401
+import time
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy
+import txaio
+
+from socs.agents.pysmurf_monitor.agent import (MIN_QUEUE_TIMEOUT,
+                                               PysmurfMonitor, make_parser)
+from socs.db.suprsync import SupRsyncFilesManager
+
+txaio.use_twisted()
+
+
+def create_monitor(args):
+    agent = SimpleNamespace(log=txaio.make_logger(),
+                            register_feed=lambda *args, **kwargs: None)
+    return PysmurfMonitor(agent, make_parser().parse_args(args))
+
+
+@pytest.mark.parametrize('value,expected', [('True', True), ('False', False),
+                                            ('1', True), ('0', False)])
+def test_create_table_arg(value, expected):
+    args = make_parser().parse_args(['--create-table', value])
+    assert args.create_table is expected
+
+
+def test_create_table_false(tmp_path):
+    db_path = tmp_path / 'suprsync.db'
+    monitor = create_monitor(['--db-path', str(db_path),
+                              '--create-table', 'False'])
+    monitor.run(SimpleNamespace(degraded=False), {'test_mode': True})
+
+    engine = sqlalchemy.create_engine(f'sqlite:///{db_path}')
+    assert sqlalchemy.inspect(engine).get_table_names() == []
+
+
+def test_run_batches(tmp_path):
+    db_path = tmp_path / 'suprsync.db'
+    monitor = create_monitor(['--db-path', str(db_path),
+                              '--batch-size', '4'])
+
+    nfiles = 10
+    for i in range(nfiles):
+        path = tmp_path / f'{i}.txt'
+        path.write_text(str(i))
+        monitor.file_queue.put({'path': str(path),
+                                'archive_name': 'timestreams'})
+
+    # Each test_mode run adds at most one batch to the db
+    srfm = SupRsyncFilesManager(db_path)
+    counts = []
+    for _ in range(3):
+        monitor.run(SimpleNamespace(degraded=False), {'test_mode': True})
+        counts.append(len(srfm.get_known_files('timestreams')))
+
+    assert counts == [4, 8, nfiles]
+
+
+def test_run_nonpositive_flush_interval(tmp_path):
+    monitor = create_monitor(['--db-path', str(tmp_path / 'suprsync.db'),
+                              '--flush-interval', '0'])
+    path = tmp_path / 'test.txt'
+    path.write_text('test')
+    monitor.file_queue.put({'path': str(path), 'archive_name': 'timestreams'})
+
+    # Blocks on the empty queue instead of returning immediately
+    start = time.time()
+    monitor.run(SimpleNamespace(degraded=False), {'test_mode': True})
+    monitor.run(SimpleNamespace(degraded=False), {'test_mode': True})
+    assert time.time() - start >= MIN_QUEUE_TIMEOUT
+
+    srfm = SupRsyncFilesManager(tmp_path / 'suprsync.db')
+    assert len(srfm.get_known_files('timestreams')) == 1
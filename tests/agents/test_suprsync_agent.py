@@ -1,9 +1,15 @@
 import os
+import subprocess
+import tempfile
 import time
+from types import SimpleNamespace
+from unittest import mock
 
 import numpy as np
+import pytest
 import txaio
 
+from socs.agents.suprsync import agent as suprsync_agent
 from socs.db.suprsync import (SupRsyncFileHandler, SupRsyncFilesManager,
                               TimecodeDir)
 
@@ -22,6 +28,18 @@ def test_suprsync_files_manager(tmp_path):
     srfm.add_file(str(fpath.absolute()), 'test.txt', 'test')
 
 
+def test_suprsync_files_manager_wal(tmp_path):
+    """
+    Tests that connections to the suprsync db use write-ahead logging.
+    """
+    srfm = SupRsyncFilesManager(tmp_path / 'test.db')
+    with srfm._engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        sync = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+    assert mode == 'wal'
+    assert sync == 1  # NORMAL
+
+
 def test_timecode_dirs(tmp_path):
     txaio.start_logging(level='info')
     txaio.make_logger()
@@ -83,7 +101,8 @@ def test_timecode_dirs(tmp_path):
     assert (len(finalize_files) == len(tcs) - 1)
 
 
-def test_suprsync_handle_files(tmp_path):
+@pytest.mark.parametrize('copy_workers', [1, 4])
+def test_suprsync_handle_files(tmp_path, copy_workers):
     """
     Tests file handling
     """
@@ -119,7 +138,8 @@ def test_suprsync_handle_files(tmp_path):
                   deletable=False)
 
     # This is done in the suprsync run process
-    handler = SupRsyncFileHandler(srfm, 'test', remote_basedir)
+    handler = SupRsyncFileHandler(srfm, 'test', remote_basedir,
+                                  copy_workers=copy_workers)
     handler.copy_files()
     handler.delete_files(0)
 
@@ -128,3 +148,118 @@ def test_suprsync_handle_files(tmp_path):
 
     ncopied = len(os.listdir(os.path.join(remote_basedir, 'test_remote')))
     assert ncopied == nfiles + 1
+
+
+def test_suprsync_run_sleeps_after_failed_batch(tmp_path, monkeypatch):
+    """
+    Tests that a full batch of files that fail to copy does not skip the
+    sleep between iterations.
+    """
+    db_path = str(tmp_path / 'test.db')
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+
+    srfm = SupRsyncFilesManager(db_path)
+    for i in range(2):
+        path = str(data_dir / f'{i}.npy')
+        np.save(path, np.zeros(10))
+        # Wrong local md5sum so the copy is marked as failed
+        srfm.add_file(path, f'test_remote/{i}.npy', 'test',
+                      local_md5sum='bad')
+
+    parser = suprsync_agent.make_parser()
+    args = parser.parse_args([
+        '--archive-name', 'test',
+        '--remote-basedir', str(dest),
+        '--db-path', db_path,
+        '--suprsync-file-root', str(tmp_path / 'suprsync'),
+        '--files-per-batch', '2',
+        '--sleep-time', '60',
+    ])
+    args.instance_id = 'test-sync'
+    suprsync = suprsync_agent.SupRsync(mock.MagicMock(), args)
+
+    sleeps = []
+
+    def sleep(t):
+        sleeps.append(t)
+        suprsync.running = False
+
+    monkeypatch.setattr(suprsync_agent, 'time',
+                        SimpleNamespace(time=time.time, sleep=sleep))
+
+    session = SimpleNamespace(data={})
+    suprsync.run(session)
+
+    assert session.data['counters']['iterations'] == 1
+    assert sleeps == [60]
+
+
+@pytest.mark.parametrize('ssh_key', [None, '/path/to/key'])
+@pytest.mark.parametrize('ssh_control_persist', [None, 60])
+def test_suprsync_ssh_cmd(tmp_path, monkeypatch, ssh_key, ssh_control_persist):
+    """
+    Tests the ssh commands used to run commands on, and rsync to, the remote.
+    """
+    srfm = SupRsyncFilesManager(tmp_path / 'test.db')
+    fpath = tmp_path / 'test.txt'
+    fpath.write_text('test')
+    srfm.add_file(str(fpath), 'test.txt', 'test')
+
+    handler = SupRsyncFileHandler(
+        srfm, 'test', '/remote', ssh_host='user@host', ssh_key=ssh_key,
+        ssh_control_persist=ssh_control_persist)
+
+    expected = ['ssh']
+    if ssh_key is not None:
+        expected += ['-i', ssh_key]
+    if ssh_control_persist is not None:
+        control_path = os.path.join(tempfile.gettempdir(), 'suprsync-ssh-%C')
+        expected += ['-o', 'ControlMaster=auto',
+                     '-o', f'ControlPath={control_path}',
+                     '-o', f'ControlPersist={ssh_control_persist}']
+    assert handler._ssh_cmd() == expected
+
+    # Remote commands
+    run = mock.MagicMock(return_value=SimpleNamespace(stdout=b'', stderr=b''))
+    monkeypatch.setattr(subprocess, 'run', run)
+    handler.run_on_remote(['ls'])
+    assert run.call_args.args[0] == expected + ['user@host', 'ls']
+
+    # rsync uses the same ssh command
+    run_parallel = mock.MagicMock()
+    monkeypatch.setattr(handler, '_run_parallel', run_parallel)
+    handler.copy_files()
+    cmds = run_parallel.call_args.args[0]
+    assert len(cmds) == 1
+    rsh = cmds[0][cmds[0].index('--rsh') + 1]
+    assert rsh == ' '.join(expected)
+    assert cmds[0][-1] == 'user@host:/remote'
+
+
+def test_suprsync_local_cmd(tmp_path, monkeypatch):
+    """
+    Tests that no ssh is used without an ssh host, even if a key is set.
+    """
+    srfm = SupRsyncFilesManager(tmp_path / 'test.db')
+    fpath = tmp_path / 'test.txt'
+    fpath.write_text('test')
+    srfm.add_file(str(fpath), 'test.txt', 'test')
+
+    handler = SupRsyncFileHandler(srfm, 'test', '/remote',
+                                  ssh_key='/path/to/key',
+                                  ssh_control_persist=60)
+
+    run = mock.MagicMock(return_value=SimpleNamespace(stdout=b'', stderr=b''))
+    monkeypatch.setattr(subprocess, 'run', run)
+    handler.run_on_remote(['ls'])
+    assert run.call_args.args[0] == ['ls']
+
+    run_parallel = mock.MagicMock()
+    monkeypatch.setattr(handler, '_run_parallel', run_parallel)
+    handler.copy_files()
+    cmd = run_parallel.call_args.args[0][0]
+    assert '--rsh' not in cmd
+    assert cmd[-1] == '/remote'
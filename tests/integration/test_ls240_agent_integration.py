@@ -15,23 +15,10 @@ run_agent = create_agent_runner_fixture(
 client = create_client_fixture('LSA240S')
 
 initial_responses = {'*IDN?': 'LSCI,MODEL240,LSA240S,1.3',
-                     'MODNAME?': 'LSA240S',
-                     'INTYPE? 1': '1,1,0,0,1,1',
-                     'INNAME? 1': 'Channel 1',
-                     'INTYPE? 2': '1,1,0,0,1,1',
-                     'INNAME? 2': 'Channel 2',
-                     'INTYPE? 3': '1,1,0,0,1,1',
-                     'INNAME? 3': 'Channel 3',
-                     'INTYPE? 4': '1,1,0,0,1,1',
-                     'INNAME? 4': 'Channel 4',
-                     'INTYPE? 5': '1,1,0,0,1,1',
-                     'INNAME? 5': 'Channel 5',
-                     'INTYPE? 6': '1,1,0,0,1,1',
-                     'INNAME? 6': 'Channel 6',
-                     'INTYPE? 7': '1,1,0,0,1,1',
-                     'INNAME? 7': 'Channel 7',
-                     'INTYPE? 8': '1,1,0,0,1,1',
-                     'INNAME? 8': 'Channel 8'}
+                     'MODNAME?': 'LSA240S'}
+for i in range(1, 9):
+    initial_responses[f'INTYPE? {i}'] = '1,1,0,0,1,1'
+    initial_responses[f'INNAME? {i}'] = f'Channel {i}'
 emulator = create_device_emulator(initial_responses, relay_type='serial')
 
 
@@ -48,23 +35,10 @@ def test_ls240_init_lakeshore(wait_for_crossbar, emulator, run_agent, client):
 def test_ls240_start_acq(wait_for_crossbar, emulator, run_agent, client):
     client.init_lakeshore()
 
-    responses = {'*IDN?': 'LSCI,MODEL240,LSA240S,1.3',
-                 'KRDG? 1': '+1.0E-03',
-                 'SRDG? 1': '+1.0E+03',
-                 'KRDG? 2': '+1.0E-03',
-                 'SRDG? 2': '+1.0E+03',
-                 'KRDG? 3': '+1.0E-03',
-                 'SRDG? 3': '+1.0E+03',
-                 'KRDG? 4': '+1.0E-03',
-                 'SRDG? 4': '+1.0E+03',
-                 'KRDG? 5': '+1.0E-03',
-                 'SRDG? 5': '+1.0E+03',
-                 'KRDG? 6': '+1.0E-03',
-                 'SRDG? 6': '+1.0E+03',
-                 'KRDG? 7': '+1.0E-03',
-                 'SRDG? 7': '+1.0E+03',
-                 'KRDG? 8': '+1.0E-03',
-                 'SRDG? 8': '+1.0E+03'}
+    responses = {'*IDN?': 'LSCI,MODEL240,LSA240S,1.3'}
+    for i in range(1, 9):
+        responses[f'KRDG? {i}'] = '+1.0E-03'
+        responses[f'SRDG? {i}'] = '+1.0E+03'
     emulator.define_responses(responses)
 
     resp = client.acq.start(sampling_frequency=1.0)
@@ -1 +1,19 @@
-from socs import util  # noqa: F401
+import hashlib
+
+from socs import util
+
+
+def test_get_md5sum(tmp_path):
+    # Binary data with embedded newlines, spanning multiple read chunks
+    data = bytes(range(256)) * ((3 * util._CHUNK_SIZE) // 256 + 7)
+    fpath = tmp_path / 'test.bin'
+    fpath.write_bytes(data)
+
+    assert util.get_md5sum(fpath) == hashlib.md5(data).hexdigest()
+
+
+def test_get_md5sum_empty(tmp_path):
+    fpath = tmp_path / 'empty.bin'
+    fpath.write_bytes(b'')
+
+    assert util.get_md5sum(fpath) == hashlib.md5(b'').hexdigest()